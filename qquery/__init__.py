@@ -1,6 +1,9 @@
 """ Interface to Quicken-For-Mac data base"""
 
+import collections
+import os
 import sqlite3
+import sys
 import time
 
 _qdb = None
@@ -41,9 +44,12 @@ def getPayees ():
     """ Returns a list of payees as an iterator """
     return _payees
 
-def getTransactions ():
-    """ Returns a list of transactions as an iterator """
-    _transactions = _Transactions ()
+def getTransactions (fields=None):
+    """ Returns a list of transactions as an iterator.
+         Optionally restrict each transaction to the named fields,
+         e.g. fields=['date','amount','categoryPath'], which avoids
+         querying anything the caller does not use."""
+    _transactions = _Transactions (fields)
     return _transactions
 
 def getSecurities ():
@@ -54,6 +60,19 @@ def getQuotes (key):
     """ Returns a list of price quotes for given security as an iterator """
     return _Quotes(key)
 
+def getPeriodic (period='month', rolling=(3, 12),
+                 groupBy=('account', 'category')):
+    """ Returns per-period transaction totals as an iterator.
+         period is 'month', 'quarter' or 'year'.  Totals are grouped by
+         account and/or category (groupBy) and each result also carries
+         rolling averages over the last N periods for each N in rolling,
+         the running balance and the change from the same period one
+         year earlier.  All of these are computed in a single query.
+         setRestrictToDates selects whole periods; the rolling, running
+         and year-over-year figures still include earlier transactions,
+         so runningBalance carries the balance from before dateFrom."""
+    return _Periodic (period, rolling, groupBy)
+
 def setRestrictToDates (dateFrom=None, dateTo=None):
     """ Restrict date range of subsequent queries.  Format is YYYY-MM-DD"""
     global _dateFrom, _dateTo
@@ -89,9 +108,42 @@ def setRestrictToSecurities (restrictToSecurities):
     _restrictToSecurities = restrictToSecurities
     return
 
+def setCacheLimits (maxEntries=None, maxBytes=None):
+    """ Set the size of the in-memory query result cache.
+         Least recently used results are evicted once either the number
+         of entries or their (estimated) size in bytes exceeds the limit.
+         A limit left as None keeps its current value (initially 128
+         entries and 64 MB).  maxEntries=0 disables caching."""
+    if (maxEntries is not None and maxEntries < 0) \
+       or (maxBytes is not None and maxBytes < 0):
+        print ('setCacheLimits: limits must not be negative: ',
+               maxEntries, maxBytes)
+        exit()
+    _cache.setLimits (maxEntries, maxBytes)
+    return
+
+def getCacheStats ():
+    """ Returns a dictionary of query result cache statistics
+         (hits, misses, entries, bytes, maxEntries, maxBytes). """
+    return _cache.getStats ()
+
+def clearCache ():
+    """ Discard all cached query results and reset the hit/miss counters. """
+    _cache.clear ()
+    return
+
 def getPriceOnDate (securityName, date):
     """ Return security price on date, or most recent prior date. """
     """ Date format is YYYY-MM-DD."""
+    cacheKey = ('price', _fingerprint (), securityName, date)
+    price = _cache.get (cacheKey)
+    if price is not None:
+        return price
+    price = _lookupPriceOnDate (securityName, date)
+    _cache.put (cacheKey, price)
+    return price
+
+def _lookupPriceOnDate (securityName, date):
     price = 0.00
     nextPrice = 0.00
     cursor = _connection.cursor()
@@ -120,6 +172,91 @@ def _formatQuickenDate (qtime):
                                      qgmtime.tm_mon,
                                      qgmtime.tm_mday)
 
+def _fingerprint ():
+    """ Identify the current state of the database file, so that cached
+         results are invalidated whenever the file changes. """
+    st = os.stat (_qdb)
+    dataVersion = _connection.execute ('pragma data_version').fetchone()[0]
+    return (os.path.abspath (_qdb), st.st_size, st.st_mtime_ns, dataVersion)
+
+def _normalizeRestriction (restriction):
+    """ Order-independent, hashable form of a setRestrictTo* value. """
+    if restriction is None:
+        return None
+    return tuple (sorted (set (restriction)))
+
+def _sizeOf (value):
+    """ Rough estimate of the memory used by a cached result.
+         Dictionary keys are field names shared by every row, so only
+         the values are counted. """
+    size = sys.getsizeof (value)
+    if isinstance (value, dict):
+        for v in value.values():
+            size += sys.getsizeof (v)
+    elif isinstance (value, (list, tuple)):
+        for v in value:
+            size += _sizeOf (v)
+    return size
+
+
+def _restrictionConditional (restrictToAccounts, restrictToCategories,
+                             restrictToPayees, restrictToSecurities,
+                             accountColumn, categoryColumn, C=None):
+    """ Build the SQL 'where' clause for the setRestrictTo* values.
+         C is an already loaded _Categories, if the caller has one. """
+    SQLconditional = ''
+
+    if restrictToAccounts != None:
+        A = _Accounts ()
+        if SQLconditional == '':
+            token = ' where ('
+        else:
+            token = ' or ('
+        for accountName in restrictToAccounts:
+            SQLconditional += token + accountColumn + '=' \
+                              + str(A.getKeyByName(accountName))
+            token = ' or '
+        SQLconditional += ') '
+
+    if restrictToCategories != None:
+        if C is None:
+            C = _Categories ()
+        if SQLconditional == '':
+            token = ' where ('
+        else:
+            token = ' and ('
+        for categoryPath in restrictToCategories:
+            SQLconditional += token + categoryColumn + '=' \
+                              + str(C.getKeyByPath(categoryPath))
+            token = ' or '
+        SQLconditional += ') '
+
+    if restrictToPayees != None:
+        P = _Payees ()
+        if SQLconditional == '':
+            token = ' where ('
+        else:
+            token = ' and ('
+        for payeeName in restrictToPayees:
+            SQLconditional += token + accountColumn + '=' \
+                              + str(P.getKeyByName(payeeName))
+            token = ' or '
+        SQLconditional += ') '
+
+    if restrictToSecurities != None:
+        S = _Securities ()
+        if SQLconditional == '':
+            token = ' where ('
+        else:
+            token = ' and ('
+        for securityName in restrictToSecurities:
+            SQLconditional += token + accountColumn + '=' \
+                              + str(S.getKeyByName(securityName))
+            token = ' or '
+        SQLconditional += ') '
+
+    return SQLconditional
+
 
 ##############################################################################
 
@@ -344,148 +481,439 @@ class _UserTags:
 
 ##############################################################################
 
+class _ResultCache:
+    def __init__ (self, maxEntries=128, maxBytes=64*1024*1024):
+        self.entries = collections.OrderedDict ()
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+    def get (self, key):
+        if key in self.entries:
+            self.entries.move_to_end (key)
+            self.hits += 1
+            return self.entries[key]['value']
+        self.misses += 1
+        return None
+    def put (self, key, value, size=None):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)['size']
+        if self.maxEntries <= 0:
+            return
+        if size is None:
+            size = _sizeOf (value)
+        if size > self.maxBytes:
+            return
+        self.entries[key] = {'value': value, 'size': size}
+        self.bytes += size
+        self.evict ()
+    def evict (self):
+        while self.entries and (len(self.entries) > self.maxEntries
+                                or self.bytes > self.maxBytes):
+            key, entry = self.entries.popitem (last=False)
+            self.bytes -= entry['size']
+    def setLimits (self, maxEntries, maxBytes):
+        if maxEntries is not None:
+            self.maxEntries = maxEntries
+        if maxBytes is not None:
+            self.maxBytes = maxBytes
+        self.evict ()
+    def clear (self):
+        self.entries.clear ()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+    def getStats (self):
+        return {'hits':       self.hits,
+                'misses':     self.misses,
+                'entries':    len(self.entries),
+                'bytes':      self.bytes,
+                'maxEntries': self.maxEntries,
+                'maxBytes':   self.maxBytes}
+
+_cache = _ResultCache ()
+
+##############################################################################
+
+# Columns that may be selected by _Transactions, with the join (if any)
+# each one requires.
+_transactionColumns = {
+    'transactionKey':        ('ztransaction.z_pk',                    None),
+    'parentAccountKey':      ('ztransaction.zaccount',                None),
+    'parentDate':            ('ztransaction.zentereddate',            None),
+    'parentPayeeKey':        ('ztransaction.zuserpayee',              None),
+    'parentNote':            ('ztransaction.znote',                   None),
+    'parentSecurityShares':  ('ztransaction.zunits',                  None),
+    'parentAccountName':     ('zaccount.zname',                       'zaccount'),
+    'parentPayeeName':       ('zuserpayee.zname',                     'zuserpayee'),
+    'parentSecurityKey':     ('zposition.zsecurity',                  'zposition'),
+    'parentSecurityName':    ('zsecurity.zname',                      'zsecurity'),
+    'parentSecurityTicker':  ('zsecurity.zticker',                    'zsecurity'),
+    'parentTypeKey':         ('ztransaction.ztype',                   None),
+    'parentCommission':      ('ztransaction.zcommission',             None),
+    'parentCostBasis':       ('ztransaction.zcostbasis',              None),
+    'splitCategoryKey':      ('zcashflowtransactionentry.zcategorytag', None),
+    'splitAmount':           ('zcashflowtransactionentry.zamount',    None),
+    'splitNote':             ('zcashflowtransactionentry.znote',      None),
+    'stockSplitNumerator':   ('ztransaction.znumerator',              None),
+    'stockSplitDenominator': ('ztransaction.zdenominator',            None),
+    'splitTransferKey':      ('zcashflowtransactionentry.ztransfer',  None),
+    'splitTransactionKey':   ('zcashflowtransactionentry.z_pk',       None),
+}
+
+# Joins in the order they must appear, with the joins they depend on.
+_transactionJoins = [
+    ('zaccount',   (), '  left join zaccount '
+                       '    on zaccount.z_pk = ztransaction.zaccount '),
+    ('zuserpayee', (), '  left join zuserpayee '
+                       '    on zuserpayee.z_pk = ztransaction.zuserpayee '),
+    ('zposition',  (), '  left join zposition '
+                       '    on zposition.z_pk = ztransaction.zposition '),
+    ('zsecurity',  ('zposition',),
+                       '  left join zsecurity '
+                       '    on zsecurity.z_pk = zposition.zsecurity '),
+]
+
+# Fields of each transaction row, and the columns needed to compute them.
+_transactionFields = {
+    'key':              ('transactionKey',),
+    'date':             ('parentDate',),
+    'amount':           ('splitAmount',),
+    'accountKey':       ('parentAccountKey',),
+    'payeeKey':         ('parentPayeeKey',),
+    'categoryKey':      ('splitCategoryKey',),
+    'accountName':      ('parentAccountName',),
+    'categoryPath':     ('splitCategoryKey',),
+    'payeeName':        ('parentPayeeName',),
+    'securityShares':   ('parentSecurityShares',),
+    'securityKey':      ('parentSecurityKey',),
+    'securityName':     ('parentSecurityName',),
+    'securityTicker':   ('parentSecurityTicker',),
+    'parentNote':       ('parentNote',),
+    'typeKey':          ('parentTypeKey',),
+    'commission':       ('parentCommission',),
+    'costbasis':        ('parentCostBasis',),
+    'splitNote':        ('splitNote',),
+    'numerator':        ('stockSplitNumerator',),
+    'denominator':      ('stockSplitDenominator',),
+    'transferAcctName': ('splitTransferKey',),
+    'transferAcctKey':  ('splitTransferKey',),
+    'tags':             ('splitTransactionKey',),
+}
+
 class _Transactions:
-    def __init__ (self):
-        self.counter=0
+    def __init__ (self, fields=None):
         self.dateTo = _dateTo
         self.dateFrom = _dateFrom
-        self.A = _Accounts ()
-        self.C = _Categories ()
-        self.P = _Payees ()
-        self.S = _Securities ()
-        self.T = _Transfers ()
-        self.U = _UserTags ()
-        self.SQLconditional = ''
-
-        if _restrictToAccounts != None:
-            if self.SQLconditional == '':
-                token = ' where ('
-            else:
-                token = ' or ('
-            for accountName in _restrictToAccounts:
-                self.SQLconditional += token + 'parentAccountKey=' \
-                                    + str(self.A.getKeyByName(accountName))
-                token = ' or '
-            self.SQLconditional += ') '
-
-        if _restrictToCategories != None:
-            if self.SQLconditional == '':
-                token = ' where ('
-            else:
-                token = ' and ('
-            for categoryPath in _restrictToCategories:
-                self.SQLconditional += token + 'splitCategoryKey=' \
-                                    + str(self.C.getKeyByPath(categoryPath))
-                token = ' or '
-            self.SQLconditional += ') '
-
-        if _restrictToPayees != None:
-            if self.SQLconditional == '':
-                token = ' where ('
-            else:
-                token = ' and ('
-            for payeeName in _restrictToPayees:
-                self.SQLconditional += token + 'parentAccountKey=' \
-                                    + str(self.P.getKeyByName(payeeName))
-                token = ' or '
-            self.SQLconditional += ') '
-
-        if _restrictToSecurities != None:
-            if self.SQLconditional == '':
-                token = ' where ('
-            else:
-                token = ' and ('
-            for securityName in _restrictToSecurities:
-                self.SQLconditional += token + 'parentAccountKey=' \
-                                    + str(self.S.getKeyByName(securityName))
-                token = ' or '
-            self.SQLconditional += ') '
+        self.restrictToAccounts = _restrictToAccounts
+        self.restrictToCategories = _restrictToCategories
+        self.restrictToPayees = _restrictToPayees
+        self.restrictToSecurities = _restrictToSecurities
+        if fields is None:
+            self.fields = list (_transactionFields.keys())
+        else:
+            self.fields = list (fields)
+        for field in self.fields:
+            if field not in _transactionFields:
+                print ('Transactions: unknown field: ', field)
+                exit()
+
+    def prepare (self):
+        # Only load the lookup tables that the requested fields and
+        # restrictions actually use.
+        self.C = None
+        if self.restrictToCategories != None or 'categoryPath' in self.fields:
+            self.C = _Categories ()
+        if 'transferAcctName' in self.fields or 'transferAcctKey' in self.fields:
+            self.T = _Transfers ()
+        if 'tags' in self.fields:
+            self.U = _UserTags ()
+        self.SQLconditional = _restrictionConditional (
+            self.restrictToAccounts, self.restrictToCategories,
+            self.restrictToPayees, self.restrictToSecurities,
+            'parentAccountKey', 'splitCategoryKey',
+            self.C)
+
+    def buildSQL (self):
+        """ Select only the columns and joins the requested fields need. """
+        # Date and amount are always needed for filtering, and the
+        # restrictions refer to the account and category keys.
+        columns = ['parentDate', 'splitAmount']
+        if self.restrictToAccounts != None or self.restrictToPayees != None \
+           or self.restrictToSecurities != None:
+            columns.append ('parentAccountKey')
+        if self.restrictToCategories != None:
+            columns.append ('splitCategoryKey')
+        for field in self.fields:
+            for column in _transactionFields[field]:
+                if column not in columns: columns.append (column)
+        joins = set()
+        for column in columns:
+            join = _transactionColumns[column][1]
+            if join is not None: joins.add (join)
+        for name, requires, clause in _transactionJoins:
+            if name in joins: joins.update (requires)
 
-    def __iter__ (self):
-        self.cursor = _connection.cursor()
-        # Not all of the following fields are used (yet).
         SQL  = 'select '
-        SQL += '  ztransaction.z_pk                 as transactionKey, '
-        SQL += '  ztransaction.zaccount             as parentAccountKey, '
-        SQL += '  ztransaction.zentereddate         as parentDate, '
-        SQL += '  ztransaction.zchecknumber         as parentCheckNumber, '
-        SQL += '  ztransaction.zuserpayee           as parentPayeeKey, '
-        SQL += '  ztransaction.zamount              as parentAmount, '
-        SQL += '  ztransaction.znote                as parentNote, '
-        SQL += '  ztransaction.zposition            as parentPositionKey, '
-        SQL += '  ztransaction.zunits               as parentSecurityShares, '
-        SQL += '  zaccount.zname                    as parentAccountName, '
-        SQL += '  zuserpayee.zname                  as parentPayeeName, '
-        SQL += '  zposition.zsecurity               as parentSecurityKey, '
-        SQL += '  zsecurity.zname                   as parentSecurityName, '
-        SQL += '  zsecurity.zticker                 as parentSecurityTicker, '
-        SQL += '  ztransaction.ztype                as parentTypeKey, '
-        SQL += '  ztransaction.zcommission          as parentCommission, '
-        SQL += '  ztransaction.zcostbasis           as parentCostBasis, '
-        SQL += '  zcashflowtransactionentry.zparent as splitParentKey, '
-        SQL += '  zcashflowtransactionentry.zcategorytag  '
-        SQL += '                                    as splitCategoryKey, '
-        SQL += '  zcashflowtransactionentry.zamount as splitAmount, '
-        SQL += '  zcashflowtransactionentry.znote   as splitNote, '
-        SQL += '  ztransaction.znumerator           as stockSplitNumerator, '
-        SQL += '  ztransaction.zdenominator         as stockSplitDenominator, '
-        SQL += '  zcashflowtransactionentry.ztransfer  '
-        SQL += '                                    as splitTransferKey, '
-        SQL += '  zcashflowtransactionentry.z_pk    as splitTransactionKey '
+        SQL += ', '.join (['  {} as {}'.format (_transactionColumns[column][0],
+                                                column)
+                           for column in columns])
         SQL += '  from  ztransaction '
         SQL += '  left join zcashflowtransactionentry '
         SQL += '    on ztransaction.z_pk = zcashflowtransactionentry.zparent '
-        SQL += '  left join zaccount '
-        SQL += '    on zaccount.z_pk = ztransaction.zaccount '
-        SQL += '  left join zuserpayee '
-        SQL += '    on zuserpayee.z_pk = ztransaction.zuserpayee '
-        SQL += '  left join zposition '
-        SQL += '    on zposition.z_pk = ztransaction.zposition '
-        SQL += '  left join zsecurity '
-        SQL += '    on zsecurity.z_pk = zposition.zsecurity '
+        for name, requires, clause in _transactionJoins:
+            if name in joins: SQL += clause
         SQL += self.SQLconditional
         SQL += '       order by parentDate asc'
-        self.cursor.execute (SQL)
+        return SQL
+
+    def __iter__ (self):
+        self.cacheKey = ('transactions', _fingerprint (),
+                         self.dateFrom, self.dateTo,
+                         _normalizeRestriction (self.restrictToAccounts),
+                         _normalizeRestriction (self.restrictToCategories),
+                         _normalizeRestriction (self.restrictToPayees),
+                         _normalizeRestriction (self.restrictToSecurities),
+                         tuple (self.fields))
+        self.counter = 0
+        self.rows = _cache.get (self.cacheKey)
+        if self.rows is not None:
+            return self
+        # Rows are collected for the cache only while they could still
+        # fit in it.
+        if _cache.maxEntries > 0:
+            self.collected = []
+            self.collectedBytes = sys.getsizeof (self.collected)
+        else:
+            self.collected = None
+        self.prepare ()
+        self.cursor = _connection.cursor()
+        self.cursor.execute (self.buildSQL ())
         return self
     def __next__ (self):
+        if self.rows is not None:
+            if self.counter >= len(self.rows):
+                raise StopIteration()
+            row = dict (self.rows[self.counter])
+            self.counter += 1
+            return row
         while True:
             trans = self.cursor.fetchone()
-            if trans==None: raise StopIteration()
+            if trans==None:
+                if self.collected is not None:
+                    _cache.put (self.cacheKey, self.collected,
+                                self.collectedBytes)
+                raise StopIteration()
             if trans['splitAmount']==None: continue
-            row = {'key':            trans['transactionKey'],
-                   'date':           _formatQuickenDate (trans['parentDate']),
-                   'amount':         trans['splitAmount'],
-                   'accountKey':     trans['parentAccountKey'],
-                   'payeeKey':       trans['parentPayeeKey'],
-                   'categoryKey':    trans['splitCategoryKey'],
-                   'accountName':    trans['parentAccountName'],
-                   'categoryPath':   \
-                               self.C.getPathByKey(trans['splitCategoryKey']),
-                   'payeeName':      trans['parentPayeeName'],
-                   'securityShares': trans['parentSecurityShares'],
-                   'securityKey':    trans['parentSecurityKey'],
-                   'securityName':   trans['parentSecurityName'],
-                   'securityTicker': trans['parentSecurityTicker'],
-                   'parentNote':     trans['parentNote'],
-                   'typeKey':        trans['parentTypeKey'],
-                   'commission':     trans['parentCommission'],
-                   'costbasis':      trans['parentCostBasis'],
-                   'splitNote':      trans['splitNote'],
-                   'numerator':      trans['stockSplitNumerator'],
-                   'denominator':    trans['stockSplitDenominator'],
-                   'transferAcctName':  \
-                              self.T.getAccountNameByTransferKey(trans['splitTransferKey']),
-                   'transferAcctKey':   \
-                              self.T.getAccountKeyByTransferKey(trans['splitTransferKey']),
-                   'tags':              \
-                              self.U.getUserTagNamesBySplitTransactionKey(trans['splitTransactionKey'])
-                   }
-
-            if row['payeeKey']==None:  row['payeeKey']=''
-            if row['payeeName']==None: row['payeeName']=''
-            if row['parentNote']==None: row['parentNote']=''
-            if row['transferAcctName']==None: row['transferAcctName']=''
-
-            if self.dateFrom != None and row['date']<self.dateFrom: continue
-            if self.dateTo   != None and row['date']>self.dateTo:   continue
+            date = _formatQuickenDate (trans['parentDate'])
+            if self.dateFrom != None and date<self.dateFrom: continue
+            if self.dateTo   != None and date>self.dateTo:   continue
+
+            row = {}
+            for field in self.fields:
+                if field == 'date':
+                    row[field] = date
+                elif field == 'categoryPath':
+                    row[field] = self.C.getPathByKey(trans['splitCategoryKey'])
+                elif field == 'transferAcctName':
+                    row[field] = self.T.getAccountNameByTransferKey(trans['splitTransferKey'])
+                elif field == 'transferAcctKey':
+                    row[field] = self.T.getAccountKeyByTransferKey(trans['splitTransferKey'])
+                elif field == 'tags':
+                    row[field] = self.U.getUserTagNamesBySplitTransactionKey(trans['splitTransactionKey'])
+                else:
+                    row[field] = trans[_transactionFields[field][0]]
+
+            for field in ('payeeKey', 'payeeName', 'parentNote', 'transferAcctName'):
+                if field in row and row[field]==None: row[field]=''
+
+            if self.collected is not None:
+                copy = dict (row)
+                self.collectedBytes += _sizeOf (copy)
+                if self.collectedBytes > _cache.maxBytes:
+                    self.collected = None
+                else:
+                    self.collected.append (copy)
             return row
+
+##############################################################################
+
+# Quicken dates as an SQLite date/time value (see _formatQuickenDate).
+_quickenDateSQL = "ztransaction.zentereddate + 978307200, 'unixepoch'"
+
+# Label, sortable integer index and number of periods per year for
+# each supported period.
+_periods = {
+    'month':   ("strftime('%Y-%m', {d})",
+                "cast(strftime('%Y', {d}) as integer) * 12 "
+                " + cast(strftime('%m', {d}) as integer) - 1",
+                12),
+    'quarter': ("strftime('%Y', {d}) || '-Q' || "
+                "((cast(strftime('%m', {d}) as integer) + 2) / 3)",
+                "cast(strftime('%Y', {d}) as integer) * 4 "
+                " + (cast(strftime('%m', {d}) as integer) - 1) / 3",
+                4),
+    'year':    ("strftime('%Y', {d})",
+                "cast(strftime('%Y', {d}) as integer)",
+                1),
+}
+
+# Grouping columns available to _Periodic.
+_periodicGroups = {
+    'account':  ('ztransaction.zaccount',                  'accountKey'),
+    'category': ('zcashflowtransactionentry.zcategorytag', 'categoryKey'),
+}
+
+class _Periodic:
+    def __init__ (self, period, rolling, groupBy):
+        # Window functions need 3.25, numeric 'range' frames need 3.28.
+        if sqlite3.sqlite_version_info < (3, 28, 0):
+            print ('Periodic: requires SQLite 3.28 or later, found: ',
+                   sqlite3.sqlite_version)
+            exit()
+        if period not in _periods:
+            print ('Periodic: unknown period: ', period)
+            exit()
+        if isinstance (rolling, int):
+            rolling = (rolling,)
+        for n in rolling:
+            if n < 1:
+                print ('Periodic: rolling periods must be positive: ', n)
+                exit()
+        for group in groupBy:
+            if group not in _periodicGroups:
+                print ('Periodic: unknown group: ', group)
+                exit()
+        self.period = period
+        self.rolling = tuple (rolling)
+        self.groupBy = [g for g in _periodicGroups if g in groupBy]
+        self.dateTo = _dateTo
+        self.dateFrom = _dateFrom
+        self.restrictToAccounts = _restrictToAccounts
+        self.restrictToCategories = _restrictToCategories
+        self.restrictToPayees = _restrictToPayees
+        self.restrictToSecurities = _restrictToSecurities
+
+    def buildSQL (self, C):
+        """ Bucket the splits by period and group, then compute the
+             rolling, running and year-over-year figures with window
+             functions over those buckets.  The buckets cover all dates,
+             so that these figures look back before dateFrom; the date
+             range only selects which (whole) periods are returned. """
+        label, index, perYear = _periods[self.period]
+        label = label.format (d=_quickenDateSQL)
+        index = index.format (d=_quickenDateSQL)
+        keys = [_periodicGroups[g][1] for g in self.groupBy]
+
+        where = _restrictionConditional (
+            self.restrictToAccounts, self.restrictToCategories,
+            self.restrictToPayees, self.restrictToSecurities,
+            'ztransaction.zaccount', 'zcashflowtransactionentry.zcategorytag',
+            C)
+        where += ' where ' if where == '' else ' and '
+        where += 'zcashflowtransactionentry.zamount is not null '
+        selected = []
+        params = {}
+        if self.dateFrom != None:
+            selected.append ('periodIndex >= '
+                             + _periods[self.period][1].format (d=':dateFrom'))
+            params['dateFrom'] = self.dateFrom
+        if self.dateTo != None:
+            selected.append ('periodIndex <= '
+                             + _periods[self.period][1].format (d=':dateTo'))
+            params['dateTo'] = self.dateTo
+
+        partition = ''
+        if keys:
+            partition = 'partition by ' + ', '.join (keys) + ' '
+        window = '(' + partition + 'order by periodIndex '
+
+        SQL  = 'with buckets as ( '
+        SQL += '  select ' + label + ' as period, '
+        SQL += '    ' + index + ' as periodIndex, '
+        for g in self.groupBy:
+            SQL += '    {} as {}, '.format (*_periodicGroups[g])
+        SQL += '    sum(zcashflowtransactionentry.zamount) as total, '
+        SQL += '    count(*) as count '
+        SQL += '  from ztransaction '
+        SQL += '  join zcashflowtransactionentry '
+        SQL += '    on ztransaction.z_pk = zcashflowtransactionentry.zparent '
+        SQL += where
+        SQL += '  group by ' + ', '.join (['periodIndex', 'period'] + keys)
+        SQL += '), figures as ( '
+        SQL += 'select period, periodIndex, '
+        for key in keys:
+            SQL += key + ', '
+        SQL += '  total, count, '
+        # Missing periods count as zero; the first periods of each group
+        # average over only the periods seen so far.
+        for n in self.rolling:
+            SQL += '  sum(total) over ' + window
+            SQL += '    range between {} preceding and current row) '.format (n-1)
+            SQL += '  / (1.0 * min({}, periodIndex - min(periodIndex) over '.format (n)
+            SQL += '(' + partition + ') + 1)) as rolling{}, '.format (n)
+        SQL += '  sum(total) over ' + window
+        SQL += '    rows between unbounded preceding and current row) '
+        SQL += '                                    as runningBalance, '
+        SQL += '  sum(total) over ' + window
+        SQL += '    range between {0} preceding and {0} preceding) '.format (perYear)
+        SQL += '                                    as priorYear '
+        SQL += 'from buckets '
+        SQL += ') '
+        SQL += 'select * from figures '
+        if selected:
+            SQL += 'where ' + ' and '.join (selected) + ' '
+        SQL += 'order by ' + ', '.join (['periodIndex'] + keys)
+        return SQL, params
+
+    def query (self):
+        # Load the lookup tables afresh, as _Transactions does, so that
+        # they match the current state of the database.
+        A = _Accounts ()
+        C = _Categories ()
+        accountNames = {a['key']: a['name'] for a in A.accounts}
+        categoryPaths = {c['key']: c['path'] for c in C.categories}
+        SQL, params = self.buildSQL (C)
+        rows = []
+        for r in _connection.cursor().execute (SQL, params):
+            row = {'period':         r['period'],
+                   'total':          r['total'],
+                   'count':          r['count']}
+            if 'account' in self.groupBy:
+                row['accountKey'] = r['accountKey']
+                row['accountName'] = accountNames.get (r['accountKey'], '')
+            if 'category' in self.groupBy:
+                row['categoryKey'] = r['categoryKey']
+                row['categoryPath'] = categoryPaths.get (r['categoryKey'], '')
+            for n in self.rolling:
+                row['rolling{}'.format (n)] = r['rolling{}'.format (n)]
+            row['runningBalance'] = r['runningBalance']
+            row['priorYear'] = r['priorYear']
+            if r['priorYear'] is None:
+                row['yearOverYear'] = None
+            else:
+                row['yearOverYear'] = r['total'] - r['priorYear']
+            rows.append (row)
+        return rows
+
+    def __iter__ (self):
+        cacheKey = ('periodic', _fingerprint (),
+                    self.period, self.rolling, tuple (self.groupBy),
+                    self.dateFrom, self.dateTo,
+                    _normalizeRestriction (self.restrictToAccounts),
+                    _normalizeRestriction (self.restrictToCategories),
+                    _normalizeRestriction (self.restrictToPayees),
+                    _normalizeRestriction (self.restrictToSecurities))
+        self.rows = _cache.get (cacheKey)
+        if self.rows is None:
+            self.rows = self.query ()
+            _cache.put (cacheKey, self.rows)
+        self.counter = 0
+        return self
+    def __next__ (self):
+        if self.counter >= len(self.rows):
+            raise StopIteration()
+        row = dict (self.rows[self.counter])
+        self.counter += 1
+        return row
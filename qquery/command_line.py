@@ -5,6 +5,18 @@ import argparse
 import time
 import math
 
+def _rollingPeriods (text):
+    """ Parse the comma separated --rolling value into period counts. """
+    try:
+        periods = [int(n) for n in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError ('not a comma separated list of '
+                                          'whole numbers: ' + text)
+    for n in periods:
+        if n < 1:
+            raise argparse.ArgumentTypeError ('must be positive: ' + str(n))
+    return periods
+
 def main():
     parser = argparse.ArgumentParser(description='Query a Quicken data base.')
     parser.add_argument('--qdb', required=True, help='Path to data base file')
@@ -30,6 +42,14 @@ def main():
                         help='Report account holdings (cash and securities).')
     parser.add_argument('--report-cash-flow', action='store_true',
                         help='Report total income or outgo by category.')
+    parser.add_argument('--report-periodic', action='store_true',
+                        help='Report totals per period, account and category.')
+    parser.add_argument('--period', default='month',
+                        choices=['month', 'quarter', 'year'],
+                        help='Period used by --report-periodic')
+    parser.add_argument('--rolling', default='3,12', type=_rollingPeriods,
+                        help='Periods (comma separated) to average over '
+                             'in --report-periodic')
     args = parser.parse_args()
 
     qq.open(args.qdb)
@@ -61,7 +81,11 @@ def main():
 
 ##############################################################################
     elif args.list_transactions:
-        for t in qq.getTransactions():
+        fields = ['key', 'date', 'accountKey', 'accountName', 'payeeKey',
+                  'payeeName', 'amount', 'categoryKey', 'categoryPath',
+                  'securityKey', 'securityName', 'securityTicker',
+                  'securityShares']
+        for t in qq.getTransactions(fields=fields):
             line = '[{:5}] '   .format(t['key']) \
                    + '{:8}'    .format(t['date'])  \
                    + '{:30}'   .format (' [{:}]'.format(t['accountKey']) + \
@@ -108,7 +132,8 @@ def main():
             qq.setRestrictToDates (args.date_from, theDate)
         balCash = {}
         balShares = {}
-        for t in qq.getTransactions():
+        fields = ['accountName', 'amount', 'securityName', 'securityShares']
+        for t in qq.getTransactions(fields=fields):
             aName = t['accountName']
             if aName in balCash.keys():
                 balCash[aName] += t['amount']
@@ -151,10 +176,33 @@ def main():
 ##############################################################################
     elif args.report_cash_flow:
         amount = {}
-        for t in qq.getTransactions():
+        for t in qq.getTransactions(fields=['categoryPath', 'amount']):
             if t['categoryPath'] in amount.keys():
                 amount[t['categoryPath']] += t['amount']
             else:
                 amount[t['categoryPath']] = t['amount']
         for path in sorted(amount.keys()):
             print ('{:30} {:12.2f}'.format (path, amount[path]))
+
+##############################################################################
+    elif args.report_periodic:
+        rolling = args.rolling
+        header = '{:8} {:20} {:30} {:>12}'.format ('period', 'account',
+                                                    'category', 'total')
+        for n in rolling:
+            header += '{:>12}'.format ('rolling{}'.format(n))
+        header += '{:>12}{:>12}'.format ('running', 'YoY')
+        print (header)
+        for p in qq.getPeriodic(period=args.period, rolling=rolling):
+            line = '{:8} '       .format(p['period']) \
+                   + '{:20.20} ' .format(p['accountName']) \
+                   + '{:30.30} ' .format(p['categoryPath']) \
+                   + '{:12.2f}'  .format(p['total'])
+            for n in rolling:
+                line += '{:12.2f}'.format(p['rolling{}'.format(n)])
+            line += '{:12.2f}'.format(p['runningBalance'])
+            if p['yearOverYear'] is not None:
+                line += '{:12.2f}'.format(p['yearOverYear'])
+            else:
+                line += '{:12}'.format('')
+            print (line)